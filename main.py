@@ -1,17 +1,96 @@
 import json
 import boto3
+from boto3.s3.transfer import TransferConfig
 import logging
 from PIL import Image
+try:
+    from PIL import ImageCms
+except ImportError:  # Pillow built without LittleCMS
+    ImageCms = None
 import io
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import time
+import uuid
+import queue
+import threading
+from urllib.parse import urlencode, unquote_plus, quote
+from functools import lru_cache
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 
-# Initialize AWS S3 client
-s3_client = boto3.client('s3')
+# Records processed at once, and ranged GETs per record during a download
+RECORD_WORKERS = 16
+DOWNLOAD_WORKERS = 8
+# Every ranged GET may be hedged once, so at most two requests per download worker are in flight
+MAX_S3_REQUESTS = RECORD_WORKERS * DOWNLOAD_WORKERS * 2
+
+# Initialize AWS S3 client, tuned for concurrent requests and fast retries of slow calls
+s3_config = Config(
+    max_pool_connections=MAX_S3_REQUESTS,
+    retries={'mode': 'adaptive', 'max_attempts': 5},
+    connect_timeout=1.0,
+    read_timeout=5.0,
+    tcp_keepalive=True,
+)
+s3_client = boto3.client('s3', config=s3_config)
 secret_client = boto3.client('secretsmanager')
 cloudfront_client = boto3.client('cloudfront')
 
+# User metadata flag written on upload, read back from head_object to skip processed files
+PROCESSED_METADATA_KEY = 'isrgbprocessed'
+
+# Bytes read to check the image mode before downloading the whole file
+HEADER_PEEK_BYTES = 64*1024
+
+# Multipart upload settings for converted images
+transfer_config = TransferConfig(
+    multipart_threshold=8*1024*1024,
+    max_concurrency=10,
+    multipart_chunksize=8*1024*1024,
+    use_threads=True,
+)
+
+# Encoded output buffers reused across records, at most one per record worker is ever live.
+# Pooled bytes are capped so idle warm containers do not hold every buffer at its peak size.
+MAX_POOLED_BUFFER_BYTES = 64*1024*1024
+buffer_pool = queue.SimpleQueue()
+_pooled_bytes = 0
+_pool_lock = threading.Lock()
+
+# S3 rejects uploads carrying more than 10 tags
+MAX_OBJECT_TAGS = 10
+
+# CloudFront accepts at most 3000 paths per invalidation request
+MAX_INVALIDATION_PATHS = 3000
+
+# Single pass JPEG encoder settings, optimize=True would run a second Huffman pass
+JPEG_FORMATS = ('JPEG', 'MPO', None)
+JPEG_SAVE_OPTIONS = {'quality': 85, 'optimize': False, 'progressive': False, 'subsampling': '4:2:0'}
+
+# Output profile for ICC based CMYK conversion
+srgb_profile = ImageCms.createProfile('sRGB') if ImageCms is not None else None
+
+# Thread pool is kept at module scope so workers persist across warm invocations
+record_executor = ThreadPoolExecutor(max_workers=RECORD_WORKERS)
+hedge_executor = ThreadPoolExecutor(max_workers=MAX_S3_REQUESTS)
+
+# Delay before a duplicate GET is sent for a request that has not responded yet
+HEDGE_DELAY_SEC = 0.2
+
+# Slack token is fetched on the first alert and reused across warm invocations
+_slack_token = None
+
+# Failures listed in one Slack digest, the rest are only counted to stay under Slack's message limit
+MAX_DIGEST_FAILURES = 50
+
+# Slack HTTP session keeps the connection alive across notifications and warm invocations
+slack_session = requests.Session()
+slack_session.headers.update({"Content-Type": "application/json"})
+slack_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -22,24 +101,54 @@ def getSecret(secret_name):
         response = secret_client.get_secret_value(SecretId=secret_name)
         return json.loads(response['SecretString'])['slack_api_token']
     except Exception as e:
-        logger.ingo(f"Error retrieving secret {secret_name}: {str(e)}")
+        logger.error(f"Error retrieving secret {secret_name}: {str(e)}")
         raise 
     
-def send_slack_notification(original_file_name,cdn_url,error_message,slack_token,retries):
+def _get_slack_token():
+    """Return the Slack token, fetching it once per container."""
+    global _slack_token
+    if _slack_token is None:
+        _slack_token = getSecret('SLACK_CMYKTORGB_ALERT_API_TOKEN')
+    return _slack_token
+
+def _format_failure(original_file_name,cdn_url,error_message,retries):
+    return (
+        f"Original File: {original_file_name}\n"
+        f"CDN URL: {cdn_url}\n"
+        f"Retries: {retries}\n"
+        f"Error: {error_message}"
+    )
+
+def send_slack_notification(original_file_name,cdn_url,error_message,retries):
+    _post_slack_message(
+        f"CMYK to RGB Conversion Failed\n"
+        + _format_failure(original_file_name, cdn_url, error_message, retries)
+    )
+
+def send_slack_digest(failures):
+    """Send all failures collected during an invocation as a single Slack message."""
+    if not failures:
+        return
+    if len(failures) == 1:
+        send_slack_notification(*failures[0])
+        return
+    text = (
+        f"*CMYK to RGB batch report*: {len(failures)} failures\n\n"
+        + "\n\n".join(_format_failure(*failure) for failure in failures[:MAX_DIGEST_FAILURES])
+    )
+    if len(failures) > MAX_DIGEST_FAILURES:
+        text += f"\n\n...and {len(failures) - MAX_DIGEST_FAILURES} more, see CloudWatch logs"
+    _post_slack_message(text)
+
+def _post_slack_message(text):
     slack_url="https://slack.com/api/chat.postMessage"
-    headers = {"Authorization": f"Bearer {slack_token}"}
     payload={
         "channel":"#cmyktorgb-alerts",
-        "text":(
-            f"CMYK to RGB Conversion Failed\n"
-            f"Original File: {original_file_name}\n"
-            f"CDN URL: {cdn_url}\n"
-            f"Retries: {retries}\n"
-            f"Error: {error_message}"
-        )
+        "text":text
     }
     try:
-        response = requests.post(slack_url,json=payload,headers=headers)
+        headers = {"Authorization": f"Bearer {_get_slack_token()}"}
+        response = slack_session.post(slack_url,json=payload,headers=headers,timeout=(1.0, 3.0))
         response.raise_for_status()
     except Exception as e:
         logger.error(f"Error sending Slack notification: {str(e)}")
@@ -50,42 +159,59 @@ def is_rgb(image):
     logger.info(f"Checking if image is RGB: {image.mode}")
     return image.mode in("RGB")
 
+@lru_cache(maxsize=8)
+def _cmyk_to_srgb_transform(icc_profile):
+    """Build (once per embedded profile) a LittleCMS transform from CMYK to sRGB."""
+    cmyk_profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+    return ImageCms.buildTransform(cmyk_profile, srgb_profile, 'CMYK', 'RGB')
+
 def convert_to_rgb(image):
-    """Convert CMYK image to RGB."""
+    """Convert CMYK image to RGB, using its embedded ICC profile when available."""
+    icc_profile = image.info.get('icc_profile')
+    if ImageCms is not None and image.mode == 'CMYK' and icc_profile:
+        try:
+            return ImageCms.applyTransform(image, _cmyk_to_srgb_transform(icc_profile))
+        except Exception as e:
+            logger.info(f"ICC transform failed, falling back to default conversion: {str(e)}")
+    # Pillow's C conversion computes (255-C)*(255-K)/255 in one pass, a NumPy
+    # version of the same formula measured about 4x slower on a 4000x4000 image
     return image.convert('RGB')
 
-def invalidate_CDN_cache(distribution_id, key):
-    """Invalidate the CDN cache for the given key."""
+def invalidate_CDN_cache(distribution_id, keys):
+    """Invalidate the CDN cache for all given keys in as few requests as possible."""
     try:
-        response = cloudfront_client.create_invalidation(
-            DistributionId=distribution_id,
-            InvalidationBatch={
-                'Paths': {
-                    'Quantity': 1,
-                    'Items': [f'/{key}']
-                },
-                'CallerReference': str(hash(key))  # Unique reference for the invalidation
-            }
-        )
-        logger.info(f"CDN cache invalidation initiated for {key}: {response}")
+        # CloudFront expects unsafe characters in paths to be percent-encoded
+        invalidation_paths = [quote(f'/{key}') for key in keys]
+        for i in range(0, len(invalidation_paths), MAX_INVALIDATION_PATHS):
+            batch = invalidation_paths[i:i + MAX_INVALIDATION_PATHS]
+            response = cloudfront_client.create_invalidation(
+                DistributionId=distribution_id,
+                InvalidationBatch={
+                    'Paths': {
+                        'Quantity': len(batch),
+                        'Items': batch
+                    },
+                    'CallerReference': uuid.uuid4().hex  # Unique reference for each invalidation batch
+                }
+            )
+            logger.info(f"CDN cache invalidation initiated for {len(batch)} paths: {response}")
     except Exception as e:
         logger.error(f"Error invalidating CDN cache: {str(e)}")
         raise
     
-def update_conversion_time(bucket, key, conversion_time):
-    try:
-        response = s3_client.get_object_tagging(Bucket=bucket, Key=key)
-        tags = response.get('TagSet', [])
-        tags = [tag for tag in tags if tag['Key'] != 'conversionTimeSec']
-        tags.append({'Key': 'conversionTimeSec', 'Value': str(conversion_time)})
-        s3_client.put_object_tagging(
-            Bucket=bucket,
-            Key=key,
-            Tagging={'TagSet': tags}
-        )
-        logger.info(f"Updated conversion time for {key} to {conversion_time} seconds")  
-    except Exception as e:
-        logger.error(f"Error updating conversion time for {key}: {str(e)}")
+def build_upload_tags(key, conversion_time, existing_tags):
+    """Build the upload Tagging string from the cached tags plus conversion time."""
+    tags = {k: v for k, v in existing_tags.items() if k not in ('conversionTimeSec', 'isRgbProcessed')}
+    # S3 allows at most 10 tags per object, the two conversion tags always take priority
+    max_carried = MAX_OBJECT_TAGS - 2
+    if len(tags) > max_carried:
+        dropped = list(tags)[max_carried:]
+        logger.warning(f"{key} has more tags than S3 allows with the conversion tags, dropping {dropped}")
+        tags = dict(list(tags.items())[:max_carried])
+    tags['conversionTimeSec'] = str(conversion_time)
+    tags['isRgbProcessed'] = 'true'
+    logger.info(f"Tagging {key} with conversion time {conversion_time} seconds")
+    return urlencode(tags)
     
 def get_image_tags(bucket, key):
     """Retrieve tags for the image from S3."""
@@ -98,145 +224,423 @@ def get_image_tags(bucket, key):
         return {}
 
 
-def lambda_handler(event, context):
-    """Lambda function to convert CMYK images to RGB."""
-    logger.info("Lambda function started")
-    # Log the entire event body
-    logger.info(f"Received event: {json.dumps(event, indent=2)}")
-    # Define the bucket
-    bucket = os.environ['TARGET_BUCKET_NAME']
-    cdn_base_url = os.environ['CDN_BASE_URL']
-    distribution_id= os.environ.get('CLOUDFRONT_DISTRIBUTION_ID')
-    result = {"status": "success", "message": "", "processed_files": []}
-    slack_token = getSecret('SLACK_CMYKTORGB_ALERT_API_TOKEN')
-    start_time=time.time()
-    retries=0
-    buffer= None
-    key=""
-    original_file_name = ""
-    
+class ImageBuffer(io.RawIOBase):
+    """Seekable in-memory file backed by a bytearray that is preallocated and reused."""
+
+    def __init__(self, capacity):
+        super().__init__()
+        self._data = bytearray(capacity)
+        self._size = 0
+        self._pos = 0
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def reset(self):
+        """Empty the buffer while keeping its allocation."""
+        self._size = 0
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def write(self, b):
+        n = len(b)
+        end = self._pos + n
+        if end > len(self._data):
+            self._data.extend(bytes(max(end, 2 * len(self._data)) - len(self._data)))
+        self._data[self._pos:end] = b
+        self._pos = end
+        self._size = max(self._size, end)
+        return n
+
+    def readinto(self, b):
+        n = max(0, min(len(b), self._size - self._pos))
+        with memoryview(self._data) as view:
+            b[:n] = view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += self._size
+        if offset < 0:
+            raise ValueError(f"negative seek position {offset}")
+        self._pos = offset
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+
+def acquire_buffer(capacity):
+    """Take a buffer from the pool, allocating one if none is large enough."""
+    global _pooled_bytes
     try:
-        # Process each record in the event
-        for record in event['Records']:
-            
-            key = record['s3']['object']['key']
-            logger.info(f"Processing file: {key}")
-
-            # Skip files not in smartsell/pages_1/
-            if not key.startswith('smartsell/pages_1/'):
-                logger.info(f"Skipping file {key}: not in smartsell/pages_1/")
-                result["processed_files"].append({"file": key, "status": "skipped", "reason": "Not in smartsell/pages_1/"})
-                continue
-            
-            try:
-                # Get the tags for the image
-                tags = get_image_tags(bucket, key)
-                logger.info(f"Tags for {key}: {tags}")
-                if 'isRgbProcessed' in tags:
-                    logger.info(f"File {key} has already been processed to RGB, skipping.")
-                    result["processed_files"].append({"file": key, "status": "skipped", "reason": "Already processed to RGB"})
-                    return
-                
-            except Exception as e:
-                logger.error(f"Error retrieving tags for {key}: {str(e)}")
-                tags = {}
-                
-            # Get file metadata to retrieve original file name
-            try:
-                metadata = s3_client.head_object(Bucket=bucket, Key=key)['Metadata']
-                original_file_name = metadata.get('original_file_name', key.split('/')[-1])
-                if len(original_file_name) > 8:
-                    original_file_name = original_file_name[8:]
-                logger.info(f"original_file_name: {original_file_name} for key {key}")
-            except Exception as e:
-                logger.error(f"Error fetching metadata for {key}: {str(e)}")
-                original_file_name = key.split('/')[-1]
-            
-            # Download the file
-            logger.info(f"Downloading {key} from bucket {bucket}")
-            try:
-                file_obj = s3_client.get_object(Bucket=bucket, Key=key)
-                file_content = file_obj['Body'].read()
-            except Exception as e:
-                logger.error(f"Error downloading {key} from S3: {str(e)} \n Retry Count: {attempt}")
-                send_slack_notification(original_file_name, f'{cdn_base_url}/{key}', f"Error while image Downloading \n System Error : {str(e)}", slack_token, retries)
-                result["processed_files"].append({"file": key, "status": "failed", "reason": str(e)})
-                continue
-            
-            # Open image with Pillow
-            image = Image.open(io.BytesIO(file_content))
+        buffer = buffer_pool.get_nowait()
+    except queue.Empty:
+        return ImageBuffer(capacity)
+    with _pool_lock:
+        _pooled_bytes -= buffer.capacity
+    if buffer.capacity < capacity:
+        return ImageBuffer(capacity)
+    return buffer
+
+
+def release_buffer(buffer):
+    """Return a buffer to the pool for the next record or warm invocation, or drop it if the pool is full."""
+    global _pooled_bytes
+    buffer.reset()
+    with _pool_lock:
+        if _pooled_bytes + buffer.capacity > MAX_POOLED_BUFFER_BYTES:
+            return
+        _pooled_bytes += buffer.capacity
+    buffer_pool.put(buffer)
+
+
+def _close_body(future):
+    """Release the connection held by a hedged GET that lost the race."""
+    if future.exception() is None:
+        future.result()['Body'].close()
+
+
+def hedged_get_object(**kwargs):
+    """Call get_object, sending a duplicate request if no response arrives within HEDGE_DELAY_SEC."""
+    started = threading.Event()
+
+    def get_object():
+        started.set()
+        return s3_client.get_object(**kwargs)
+
+    futures = [hedge_executor.submit(get_object)]
+    # Time spent queued for a worker is not counted as a slow response
+    started.wait()
+    done, _ = wait(futures, timeout=HEDGE_DELAY_SEC)
+    if not done:
+        futures.append(hedge_executor.submit(s3_client.get_object, **kwargs))
+
+    winner = None
+    for future in as_completed(futures):
+        if future.exception() is None:
+            winner = future
+            break
+    if winner is None:
+        return futures[0].result()
+    for future in futures:
+        # A hedge that has not started yet is dropped, a running one has its body closed
+        if future is not winner and not future.cancel():
+            future.add_done_callback(_close_body)
+    return winner.result()
+
+
+def _version_args(etag):
+    """GET arguments that pin a read to the object version with the given ETag."""
+    return {'IfMatch': etag} if etag else {}
+
+
+def is_precondition_failed(error):
+    """Whether an S3 error means the object no longer matches the ETag that was read."""
+    return isinstance(error, ClientError) and error.response['Error']['Code'] == 'PreconditionFailed'
+
+
+def peek_mode(bucket, key, etag=None, header_size=HEADER_PEEK_BYTES):
+    """Read only the start of the object and return its image mode, or None if undetermined."""
+    try:
+        response = hedged_get_object(Bucket=bucket, Key=key, Range=f'bytes=0-{header_size - 1}', **_version_args(etag))
+        with Image.open(io.BytesIO(response['Body'].read())) as image:
+            return image.mode
+    except Exception as e:
+        logger.info(f"Could not read image mode from header of {key}: {str(e)}")
+        return None
+
+
+def parallel_download(bucket, key, content_length=None, etag=None, part_size=8*1024*1024, workers=DOWNLOAD_WORKERS):
+    """Download an S3 object with concurrent ranged GETs into a preallocated buffer.
+
+    Every GET is pinned to ``etag`` so parts of different object versions are never mixed.
+    Without a ``content_length`` (head_object failed) the object is read with one plain GET.
+    """
+    if content_length is None:
+        return hedged_get_object(Bucket=bucket, Key=key)['Body'].read()
+    version_args = _version_args(etag)
+    if content_length <= part_size:
+        return hedged_get_object(Bucket=bucket, Key=key, **version_args)['Body'].read()
+
+    file_content = bytearray(content_length)
+
+    def download_part(start):
+        end = min(start + part_size, content_length) - 1
+        response = hedged_get_object(Bucket=bucket, Key=key, Range=f'bytes={start}-{end}', **version_args)
+        file_content[start:end + 1] = response['Body'].read()
+
+    parts = range(0, content_length, part_size)
+    with ThreadPoolExecutor(max_workers=min(workers, len(parts))) as executor:
+        for future in [executor.submit(download_part, start) for start in parts]:
+            future.result()
+    return file_content
+
+
+def upload_image(buffer, size, bucket, key, extra_args, etag=None):
+    """Upload the encoded image straight from its buffer, multipart only above the threshold."""
+    if size < transfer_config.multipart_threshold:
+        # Only overwrite the object version that was read, a duplicate event fails fast
+        if etag:
+            extra_args = {**extra_args, 'IfMatch': etag}
+        # Known length lets botocore stream the buffer without reading it to size it
+        s3_client.put_object(Bucket=bucket, Key=key, Body=buffer, ContentLength=size, **extra_args)
+    else:
+        # s3transfer does not accept IfMatch, so re-check the ETag right before the multipart upload
+        if etag and s3_client.head_object(Bucket=bucket, Key=key)['ETag'] != etag:
+            raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': f"ETag of {key} changed since it was read"}}, 'HeadObject')
+        s3_client.upload_fileobj(buffer, bucket, key, ExtraArgs=extra_args, Config=transfer_config)
+
+
+def process_record(record, bucket, cdn_base_url, start_time, failures):
+    """Process a single S3 event record and return its result entry, appending alerts to failures."""
+    retries = 0
+    buffer = None
+    # Keys arrive URL-encoded in both S3 event notifications and Batch Operations tasks
+    key = unquote_plus(record['s3']['object']['key'])
+    original_file_name = key.split('/')[-1]
+    logger.info(f"Processing file: {key}")
+
+    # Skip files not in smartsell/pages_1/
+    if not key.startswith('smartsell/pages_1/'):
+        logger.info(f"Skipping file {key}: not in smartsell/pages_1/")
+        return {"file": key, "status": "skipped", "reason": "Not in smartsell/pages_1/"}
+
+    try:
+        head = {}
+        metadata = {}
+        tags = None
+        # Idempotency checks run before any object data is read.
+        # Get file metadata to retrieve original file name and processed flag
+        try:
+            head = s3_client.head_object(Bucket=bucket, Key=key)
+            metadata = head['Metadata']
+            if metadata.get(PROCESSED_METADATA_KEY) == 'true':
+                logger.info(f"File {key} has already been processed to RGB, skipping.")
+                return {"file": key, "status": "skipped", "reason": "Already processed to RGB"}
+            original_file_name = metadata.get('original_file_name', key.split('/')[-1])
+            if len(original_file_name) > 8:
+                original_file_name = original_file_name[8:]
+            logger.info(f"original_file_name: {original_file_name} for key {key}")
+        except Exception as e:
+            logger.error(f"Error fetching metadata for {key}: {str(e)}")
+            original_file_name = key.split('/')[-1]
+            metadata = {}
+            # Without metadata fall back to the tag written by earlier uploads
+            tags = get_image_tags(bucket, key)
+            if 'isRgbProcessed' in tags:
+                logger.info(f"File {key} has already been processed to RGB, skipping.")
+                return {"file": key, "status": "skipped", "reason": "Already processed to RGB"}
+
+        # Check the mode from the file header before downloading the whole file
+        if head.get('ContentLength', 0) > HEADER_PEEK_BYTES:
+            mode = peek_mode(bucket, key, etag=head.get('ETag'))
+            logger.info(f"Header image mode for {key}: {mode}")
+            if mode == 'RGB':
+                logger.info(f"File {key} is in RGB Format, no conversion needed")
+                return {"file": key, "status": "skipped", "reason": "Not Non-RGB"}
+
+        # Download the file
+        logger.info(f"Downloading {key} from bucket {bucket}")
+        try:
+            file_content = parallel_download(bucket, key, content_length=head.get('ContentLength'), etag=head.get('ETag'))
+        except Exception as e:
+            if is_precondition_failed(e):
+                logger.info(f"File {key} changed while downloading, skipping.")
+                return {"file": key, "status": "skipped", "reason": "Modified during conversion"}
+            logger.error(f"Error downloading {key} from S3: {str(e)}")
+            failures.append((original_file_name, f'{cdn_base_url}/{key}', f"Error while image Downloading \n System Error : {str(e)}", retries))
+            return {"file": key, "status": "failed", "reason": str(e)}
+
+        # Open image with Pillow, the decoded image is closed when the block exits
+        image_data = io.BytesIO(file_content)
+        del file_content
+        with Image.open(image_data) as image:
             logger.info(f"Image mode: {image.mode}")
             # Check if non-rgb image
             if is_rgb(image):
                 logger.info(f"File {key} is in RGB Format, no conversion needed")
-                result["processed_files"].append({"file": key, "status": "skipped", "reason": "Not Non-RGB"})
-                return 
-                
-            # retries limit exceeded 
+                return {"file": key, "status": "skipped", "reason": "Not Non-RGB"}
+
+            # Tags are only needed once we know the file will be rewritten
+            if tags is None:
+                tags = get_image_tags(bucket, key)
+            logger.info(f"Tags for {key}: {tags}")
+
+            # retries limit exceeded
             retries = 3
             for attempt in range(retries):
                 try:
+                    # Decode now so the encoded bytes can be released before re-encoding,
+                    # decode errors on corrupt files are reported as processing failures
+                    image.load()
+                    image_data.close()
+
                     # Convert to RGB
                     logger.info(f"Converting {key} to RGB")
-                    rgb_image = convert_to_rgb(image)
-
-                    # Save converted image to buffer
-                    buffer = io.BytesIO()
-                    rgb_image.save(buffer, format=image.format or 'JPEG')
+                    with convert_to_rgb(image) as rgb_image:
+                        # Save converted image to a pooled, preallocated buffer
+                        if buffer is None:
+                            buffer = acquire_buffer(image.width * image.height * 3 // 4)
+                        buffer.reset()
+                        if image.format in JPEG_FORMATS:
+                            rgb_image.save(buffer, 'JPEG', **JPEG_SAVE_OPTIONS)
+                        else:
+                            rgb_image.save(buffer, format=image.format)
+                    size = buffer.tell()
                     buffer.seek(0)
                     break  # Exit the retry loop on success
                 except Exception as e:
                     logger.error(f"Error processing image {key}: {str(e)} \n Retry Count: {attempt}")
                     if attempt == retries-1:
-                        send_slack_notification(original_file_name, f'{cdn_base_url}/{key}', f"Error while image processing \n System Error : {str(e)}", slack_token, retries)
+                        failures.append((original_file_name, f'{cdn_base_url}/{key}', f"Error while image processing \n System Error : {str(e)}", retries))
+                        return {"file": key, "status": "failed", "reason": str(e)}
                     continue
-                
-            # Upload converted file
-            logger.info(f"Uploading converted file to {key}")
-            try:
-                s3_client.put_object(
-                    Bucket=bucket,
-                    Key=key,
-                    Body=buffer,
-                    ContentType=file_obj.get('ContentType', 'image/jpeg'),
-                    Tagging="isRgbProcessed=true",
-                )
-                logger.info(f"Successfully converted and uploaded {key}")
-                result["processed_files"].append({"file": key, "status": "converted", "reason": "Converted to RGB"})
-            except Exception as e:
-                logger.error(f"Error Uploading {key} to S3 : {str(e)}")
-                send_slack_notification(original_file_name, f'{cdn_base_url}/{key}', f"Error while Uploading image to S3 after conversion \n System Error : {str(e)}", slack_token, retries)
-                continue
-            
-            try:
-                conversion_time = int(time.time()-start_time)
-                update_conversion_time(bucket, key, conversion_time)
-            except Exception as e:
-                logger.error(f"Error tagging Conversion Time for {key}: {str(e)}")
-                send_slack_notification(original_file_name, f'{cdn_base_url}/{key}', f"Error while tagging Conversion Time \n System Error: {str(e)}", slack_token, retries)
-                continue
-            
-            try:
-                # Invalidate CDN cache
-                invalidate_CDN_cache(distribution_id, key)
-                logger.info(f"CDN cache invalidated for {key}")
-            except Exception as e:
-                logger.error(f"Error invalidating CDN cache for {key}: {str(e)}")
-                send_slack_notification(original_file_name, f'{cdn_base_url}/{key}', f"Error while invalidating CDN cache \n System Error : {str(e)}", slack_token, retries)
-                continue
-                
+
+        # Upload converted file, tags are written in the same request
+        logger.info(f"Uploading converted file to {key}")
+        try:
+            conversion_time = int(time.time()-start_time)
+            tagging = build_upload_tags(key, conversion_time, tags)
+            upload_image(buffer, size, bucket, key, {
+                'ContentType': head.get('ContentType', 'image/jpeg'),
+                'Tagging': tagging,
+                'Metadata': {**metadata, PROCESSED_METADATA_KEY: 'true'},
+            }, etag=head.get('ETag'))
+            logger.info(f"Successfully converted and uploaded {key}")
+            result = {"file": key, "status": "converted", "reason": "Converted to RGB"}
+        except Exception as e:
+            if is_precondition_failed(e):
+                logger.info(f"File {key} changed since it was read, skipping upload.")
+                return {"file": key, "status": "skipped", "reason": "Modified during conversion"}
+            logger.error(f"Error Uploading {key} to S3 : {str(e)}")
+            failures.append((original_file_name, f'{cdn_base_url}/{key}', f"Error while Uploading image to S3 after conversion \n System Error : {str(e)}", retries))
+            return None
+
+        return result
+
+    except Exception as e:
+        logger.error(f"Error processing file {key}: {str(e)}")
+        failures.append((original_file_name, f'{cdn_base_url}/{key}', str(e), retries))
+        return {"file": key, "status": "failed", "reason": str(e)}
+    finally:
+        if buffer is not None:
+            release_buffer(buffer)
+
+
+def invalidate_converted_files(processed_files, distribution_id, cdn_base_url, failures):
+    """Invalidate the CDN cache for every converted file, recording a failure for Slack on error."""
+    converted_keys = [f["file"] for f in processed_files if f["status"] == "converted"]
+    if not converted_keys:
+        return
+    try:
+        invalidate_CDN_cache(distribution_id, converted_keys)
+        logger.info(f"CDN cache invalidated for {converted_keys}")
+    except Exception as e:
+        logger.error(f"Error invalidating CDN cache for {converted_keys}: {str(e)}")
+        failures.append((", ".join(key.split('/')[-1] for key in converted_keys), cdn_base_url, f"Error while invalidating CDN cache \n System Error : {str(e)}", 0))
+
+
+def lambda_handler(event, context):
+    """Lambda function to convert CMYK images to RGB."""
+    logger.info("Lambda function started")
+    # Log the entire event body
+    logger.info("Received event: %s", event)
+    # Define the bucket
+    bucket = os.environ['TARGET_BUCKET_NAME']
+    cdn_base_url = os.environ['CDN_BASE_URL']
+    distribution_id= os.environ.get('CLOUDFRONT_DISTRIBUTION_ID')
+    result = {"status": "success", "message": "", "processed_files": []}
+    start_time=time.time()
+    failures = []
+
+    try:
+        # Process records concurrently, S3 calls are network bound
+        futures = [
+            record_executor.submit(process_record, record, bucket, cdn_base_url, start_time, failures)
+            for record in event['Records']
+        ]
+        for future in as_completed(futures):
+            file_result = future.result()
+            if file_result is not None:
+                result["processed_files"].append(file_result)
+
+        # Invalidate CDN cache for all converted files in one request
+        invalidate_converted_files(result["processed_files"], distribution_id, cdn_base_url, failures)
+
     except Exception as e:
         logger.error(f"Error processing event: {str(e)}")
         result["status"] = "error"
-        cdn_url = f'{cdn_base_url}/{key}'
-        send_slack_notification(original_file_name, cdn_url, str(e), slack_token,retries)
+        failures.append(("", cdn_base_url, str(e), 0))
+
+    # One Slack message for every failure in this invocation
+    send_slack_digest(failures)
 
     # Return result
-    logger.info(f"Returning result: {json.dumps(result, indent=2)}")
+    body = json.dumps(result)
+    logger.info("Returning result: %s", body)
     return {
         'statusCode': 200,
-        'body': json.dumps(result)
+        'body': body
+    }
+
+
+def batch_handler(event, context):
+    """Lambda entry point for S3 Batch Operations jobs converting many keys per invocation."""
+    logger.info("Batch function started")
+    logger.info("Received batch event: %s", event)
+    cdn_base_url = os.environ['CDN_BASE_URL']
+    distribution_id= os.environ.get('CLOUDFRONT_DISTRIBUTION_ID')
+    start_time=time.time()
+    failures = []
+
+    # Schema 1.0 tasks carry the bucket ARN, schema 2.0 tasks the bucket name
+    futures = {}
+    for task in event['tasks']:
+        bucket = task.get('s3Bucket') or task['s3BucketArn'].split(':::')[-1]
+        record = {'s3': {'object': {'key': task['s3Key']}}}
+        futures[record_executor.submit(process_record, record, bucket, cdn_base_url, start_time, failures)] = task
+
+    results = []
+    processed_files = []
+    for future in as_completed(futures):
+        task = futures[future]
+        try:
+            file_result = future.result()
+        except Exception as e:
+            logger.error(f"Error processing task {task['taskId']}: {str(e)}")
+            file_result = {"file": unquote_plus(task['s3Key']), "status": "failed", "reason": str(e)}
+        if file_result is None:
+            result_code, result_string = 'TemporaryFailure', "Upload failed"
+        else:
+            processed_files.append(file_result)
+            result_code = 'PermanentFailure' if file_result["status"] == "failed" else 'Succeeded'
+            result_string = f"{file_result['status']}: {file_result['reason']}"
+        results.append({'taskId': task['taskId'], 'resultCode': result_code, 'resultString': result_string})
+
+    invalidate_converted_files(processed_files, distribution_id, cdn_base_url, failures)
+    send_slack_digest(failures)
+
+    response = {
+        'invocationSchemaVersion': event['invocationSchemaVersion'],
+        'treatMissingKeysAs': 'PermanentFailure',
+        'invocationId': event['invocationId'],
+        'results': results,
     }
+    logger.info("Returning batch result: %s", response)
+    return response
     
 # if __name__ == "__main__":
 #     from pprint import pprint